@@ -1,6 +1,8 @@
 #pragma once
 
 #include <rbus.h>
+#include <stdint.h>
+#include <string.h>
 #include "google/protobuf/any.pb-c.h"
 #include "google/protobuf/empty.pb-c.h"
 #include "description.pb-c.h"
@@ -15,4 +17,15 @@ typedef struct {
 } PluginRegistration;
 
 // Signature of the registration function each plugin must export
-typedef PluginRegistration* (*plugin_register_fn)(void);
\ No newline at end of file
+typedef PluginRegistration* (*plugin_register_fn)(void);
+
+// 32-bit FNV-1a of a NUL-terminated key. The plugin generator switches on
+// this hash of each child key for objects with many properties.
+static inline uint32_t blizzard_fnv1a(const char* key) {
+   uint32_t h = 2166136261u;
+   while (*key) {
+      h ^= (unsigned char)*key++;
+      h *= 16777619u;
+   }
+   return h;
+}
@@ -1,21 +1,355 @@
 import argparse
+import concurrent.futures
+import functools
+import hashlib
+import json
+import mmap
 import os
+import pickle
 import sys
-import yaml
+import types
+from typing import Any, Callable, Iterable, Mapping, Optional
+
+import yaml  # type: ignore[import-untyped]
 import jinja2
 
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
+
+GENERATOR_VERSION = "1.0.0"
+
+# Inputs above this size are memory-mapped rather than read into a buffer.
+_MMAP_THRESHOLD = 1 << 20
+
+_TMPL_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmpl")
+
+_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "blizzard",
+)
+_JINJA_CACHE_DIR = os.path.join(_CACHE_DIR, "jinja")
+_CONFIG_CACHE_DIR = _CACHE_DIR
+
+
+def _template_dir(language: str) -> str:
+    return os.path.join(_TMPL_ROOT, language)
+
+
+def _compiled_path(language: str) -> str:
+    """Location of the precompiled archive for language (tmpl/<lang>.zip)."""
+    return os.path.join(_TMPL_ROOT, f"{language}.zip")
+
+
+def _compiled_is_current(language: str) -> bool:
+    """True if a precompiled archive exists and is newer than every source."""
+    template_dir = _template_dir(language)
+    compiled = _compiled_path(language)
+    try:
+        compiled_mtime = os.stat(compiled).st_mtime
+    except OSError:
+        return False
+    for name in os.listdir(template_dir):
+        if os.stat(os.path.join(template_dir, name)).st_mtime > compiled_mtime:
+            return False
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def _bytecode_cache() -> Optional[jinja2.BytecodeCache]:
+    """The on-disk bytecode cache, or None if its directory isn't writable.
+
+    Like the config cache it is best effort: jinja2 writes bytecode while
+    loading a template, so an unusable directory would fail the render.
+    """
+    try:
+        os.makedirs(_JINJA_CACHE_DIR, exist_ok=True)
+    except OSError:
+        return None
+    if not os.access(_JINJA_CACHE_DIR, os.W_OK):
+        return None
+    return jinja2.FileSystemBytecodeCache(directory=_JINJA_CACHE_DIR)
+
+
+def _get_env(language: str) -> jinja2.Environment:
+    """Return a shared Jinja environment for the language's templates.
+
+    auto_reload is disabled and the template cache is unbounded so every
+    compiled template stays resident for the life of the process. Compiled
+    bytecode is also persisted to disk so later runs skip parsing the .j2
+    sources. If an up to date archive from --precompile sits next to
+    the template directory, templates are imported from it instead.
+    """
+    loader: jinja2.BaseLoader
+    if _compiled_is_current(language):
+        loader = jinja2.ModuleLoader(_compiled_path(language))
+    else:
+        loader = jinja2.FileSystemLoader(_template_dir(language))
+    return jinja2.Environment(
+        loader=loader,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        auto_reload=False,
+        cache_size=-1,
+        bytecode_cache=_bytecode_cache(),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_template(language: str, template_name: str) -> jinja2.Template:
+    """Load template_name once per process; later renders reuse the object."""
+    return _get_env(language).get_template(template_name)
+
+
+def precompile_templates(language: str) -> str:
+    """Compile the templates for language into tmpl/<language>.zip."""
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(_template_dir(language)),
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    target = _compiled_path(language)
+    env.compile_templates(target, zip="deflated")
+    return f"Compiled templates: {target}"
+
+
+# Names of the descriptor.proto BasicTypes enum, as written in the YAML.
+_BASIC_TYPES = ("boolean", "integer", "double", "string", "bytes", "any", "any_object")
+
+
+def _kind_is(kind: str) -> dict[str, Any]:
+    return {"properties": {"kind": {"pattern": f"(?i)^{kind}$"}}}
+
+
+# JSON Schema for the plugin YAML. Validating it up front lets the code
+# generators index schema nodes directly instead of guarding every lookup.
+PLUGIN_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "definitions": {
+        "descriptor": {
+            "type": "object",
+            "required": ["kind"],
+            "properties": {
+                "kind": {"type": "string", "pattern": "(?i)^(basic|list|object|optional)$"},
+            },
+            "allOf": [
+                {
+                    "if": _kind_is("basic"),
+                    "then": {
+                        "required": ["basic"],
+                        "properties": {
+                            "basic": {"type": "string", "pattern": f"(?i)^({'|'.join(_BASIC_TYPES)})$"}
+                        },
+                    },
+                },
+                {
+                    "if": _kind_is("list"),
+                    "then": {
+                        "required": ["list"],
+                        "properties": {
+                            "list": {
+                                "type": "object",
+                                "required": ["items"],
+                                "properties": {"items": {"$ref": "#/definitions/descriptor"}},
+                            }
+                        },
+                    },
+                },
+                {
+                    "if": _kind_is("object"),
+                    "then": {
+                        "required": ["object"],
+                        "properties": {
+                            "object": {
+                                "type": "object",
+                                "required": ["properties"],
+                                "properties": {
+                                    "properties": {
+                                        "type": "object",
+                                        "additionalProperties": {"$ref": "#/definitions/descriptor"},
+                                    }
+                                },
+                            }
+                        },
+                    },
+                },
+                {
+                    "if": _kind_is("optional"),
+                    "then": {
+                        "required": ["optional"],
+                        "properties": {
+                            "optional": {
+                                "type": "object",
+                                "required": ["item"],
+                                "properties": {"item": {"$ref": "#/definitions/descriptor"}},
+                            }
+                        },
+                    },
+                },
+            ],
+        },
+    },
+    "type": "object",
+    "required": ["plugin"],
+    "properties": {
+        "plugin": {
+            "type": "object",
+            "required": ["name"],
+            "properties": {"name": {"type": "string"}},
+        },
+        "methods": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["name", "parameters_schema", "result_schema"],
+                "properties": {
+                    "name": {"type": "string"},
+                    "parameters_schema": {"$ref": "#/definitions/descriptor"},
+                    "result_schema": {"$ref": "#/definitions/descriptor"},
+                },
+            },
+        },
+    },
+}
+
+# fastjsonschema compiles the schema to Python code; fall back to jsonschema,
+# and to no upfront validation when neither is installed.
+def _jsonschema_validator(schema: dict[str, Any]) -> Callable[[dict[str, Any]], None]:
+    import jsonschema  # type: ignore[import-untyped]
+
+    validator = jsonschema.Draft7Validator(schema)
+
+    def validate(config: dict[str, Any]) -> None:
+        error = jsonschema.exceptions.best_match(validator.iter_errors(config))
+        if error is not None:
+            path = ".".join(str(p) for p in error.absolute_path)
+            raise ValueError(f"{path}: {error.message}" if path else error.message)
+
+    return validate
+
+
+def _skip_validation(config: dict[str, Any]) -> None:
+    pass
+
+
+_validate_config: Callable[[dict[str, Any]], Any]
+try:
+    import fastjsonschema  # type: ignore[import-untyped]
+
+    _validate_config = fastjsonschema.compile(PLUGIN_SCHEMA)
+except ImportError:
+    try:
+        _validate_config = _jsonschema_validator(PLUGIN_SCHEMA)
+    except ImportError:
+        _validate_config = _skip_validation
+
+
+class Schema:
+    """One node of a validated value schema.
+
+    kind and basic are lower-cased and interned, so the generators dispatch
+    on them directly. Only the child for the node's kind is set: items for
+    a list, properties (in declaration order) for an object and item for an
+    optional; the others are None. key identifies the node's shape; it is
+    computed once here for the descriptor pool.
+    """
+
+    __slots__ = ("kind", "basic", "items", "properties", "item", "key")
+
+    kind: str
+    basic: Optional[str]
+    items: Optional["Schema"]
+    properties: Optional[dict[str, "Schema"]]
+    item: Optional["Schema"]
+    key: str
+
+    def __init__(
+        self,
+        kind: str,
+        basic: Optional[str] = None,
+        items: Optional["Schema"] = None,
+        properties: Optional[dict[str, "Schema"]] = None,
+        item: Optional["Schema"] = None,
+    ) -> None:
+        self.kind = kind
+        self.basic = basic
+        self.items = items
+        self.properties = properties
+        self.item = item
+        if basic is not None:
+            self.key = "b:" + basic
+        elif items is not None:
+            self.key = "l(" + items.key + ")"
+        elif item is not None:
+            self.key = "o(" + item.key + ")"
+        elif properties is not None:
+            # Property order is significant in the emitted entries array, so
+            # it is part of the key. Names are JSON-quoted to keep it unambiguous.
+            self.key = "{" + ",".join(json.dumps(k) + ":" + v.key for k, v in properties.items()) + "}"
+        else:
+            raise ValueError(f"Schema of kind {kind!r} has no child")
+
+
+def to_schema(node: Mapping[str, Any]) -> Schema:
+    """Build a Schema tree from a validated schema mapping."""
+    kind = sys.intern(node["kind"].lower())
+    if kind == "basic":
+        return Schema(kind, basic=sys.intern(node["basic"].lower()))
+    if kind == "list":
+        return Schema(kind, items=to_schema(node["list"]["items"]))
+    if kind == "object":
+        # YAML reads unquoted keys such as on, no or 2 as bools and ints; the
+        # generators take every property name as the str it is emitted as.
+        properties: dict[str, Schema] = {}
+        for k, v in node["object"]["properties"].items():
+            name = str(k)
+            if name in properties:
+                raise ValueError(f"Duplicate property name: {name}")
+            properties[name] = to_schema(v)
+        return Schema(kind, properties=properties)
+    if kind == "optional":
+        return Schema(kind, item=to_schema(node["optional"]["item"]))
+    raise ValueError(f"Unknown schema kind: {node['kind']}")
+
+
+def _parse_yaml_file(f: Any) -> Any:
+    """Parse an open binary file, memory-mapping it if it's large.
+
+    Files that can't be mapped (pipes, some special filesystems) are read
+    into a buffer instead. Empty files are never mapped, since mmap rejects
+    a zero length.
+    """
+    if os.fstat(f.fileno()).st_size > _MMAP_THRESHOLD:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:  # mmap.error
+            pass
+        else:
+            with mm:
+                return yaml.load(mm, Loader=_SafeLoader)
+    return yaml.load(f.read(), Loader=_SafeLoader)
 
-def load_yaml(yaml_path):
+
+def load_yaml(yaml_path: str) -> dict[str, Any]:
     """Load and validate YAML input file."""
     try:
-        with open(yaml_path, "r") as f:
-            config = yaml.safe_load(f)
+        with open(yaml_path, "rb") as f:
+            config = _parse_yaml_file(f)
             if not config or "plugin" not in config or "name" not in config["plugin"]:
                 raise ValueError("Invalid YAML: Must contain 'plugin' with 'name'")
+            _validate_config(config)
+            for method in config.get("methods") or ():
+                method["parameters_schema"] = to_schema(method["parameters_schema"])
+                method["result_schema"] = to_schema(method["result_schema"])
             return config
     except FileNotFoundError:
         print(f"Error: YAML file '{yaml_path}' not found")
         sys.exit(1)
+    except OSError as e:
+        print(f"Error reading YAML file '{yaml_path}': {e}")
+        sys.exit(1)
     except yaml.YAMLError as e:
         print(f"Error parsing YAML: {e}")
         sys.exit(1)
@@ -24,229 +358,524 @@ def load_yaml(yaml_path):
         sys.exit(1)
 
 
-def generate_descriptor_init(schema, var_name, indent_level=0):
-    indent = "   " * indent_level
-    code = ""
-    kind = schema.get("kind", "").lower()
-    if kind == "basic":
-        basic_type = schema.get("basic", "").upper()
-        code += f"{indent}static Blizzard__Descriptor__Descriptor {var_name} = BLIZZARD__DESCRIPTOR__DESCRIPTOR__INIT;\n"
-        code += f"{indent}{var_name}.kind_case = BLIZZARD__DESCRIPTOR__DESCRIPTOR__KIND_BASIC;\n"
-        code += f"{indent}{var_name}.basic = BLIZZARD__DESCRIPTOR__BASIC_TYPES__{basic_type};\n"
-    elif kind == "list":
-        code += f"{indent}static Blizzard__Descriptor__Descriptor {var_name} = BLIZZARD__DESCRIPTOR__DESCRIPTOR__INIT;\n"
-        items_schema = schema.get("list", {}).get("items", {})
-        list_var = f"{var_name}_list"
-        items_var = f"{var_name}_items"
-        code += f"{indent}static Blizzard__Descriptor__List {list_var} = BLIZZARD__DESCRIPTOR__LIST__INIT;\n"
-        code += generate_descriptor_init(items_schema, items_var, indent_level)
-        code += f"{indent}{list_var}.items = &{items_var};\n"
-        code += f"{indent}{var_name}.list = &{list_var};\n"
-        code += f"{indent}{var_name}.kind_case = BLIZZARD__DESCRIPTOR__DESCRIPTOR__KIND_LIST;\n"
-    elif kind == "object":
-        code += f"{indent}static Blizzard__Descriptor__Descriptor {var_name} = BLIZZARD__DESCRIPTOR__DESCRIPTOR__INIT;\n"
-        properties = schema.get("object", {}).get("properties", {})
-        object_var = f"{var_name}_object"
-        entries_var = f"{var_name}_entries"
-        code += f"{indent}static Blizzard__Descriptor__Object {object_var} = BLIZZARD__DESCRIPTOR__OBJECT__INIT;\n"
-        entry_list = []
-        for i, (prop_key, prop_schema) in enumerate(properties.items()):
-            entry_var = f"{var_name}_prop_{i}"
-            value_var = f"{var_name}_value_{i}"
-            code += f"{indent}static Blizzard__Descriptor__Object__PropertiesEntry {entry_var} = BLIZZARD__DESCRIPTOR__OBJECT__PROPERTIES_ENTRY__INIT;\n"
-            code += f'{indent}{entry_var}.key = "{prop_key}";\n'
-            code += generate_descriptor_init(prop_schema, value_var, indent_level)
-            code += f"{indent}{entry_var}.value = &{value_var};\n"
-            entry_list.append(f"&{entry_var}")
-        code += f"{indent}static Blizzard__Descriptor__Object__PropertiesEntry* {entries_var}[] = {{{', '.join(entry_list)}}};\n"
-        code += f"{indent}{object_var}.n_properties = sizeof({entries_var}) / sizeof({entries_var}[0]);\n"
-        code += f"{indent}{object_var}.properties = {entries_var};\n"
-        code += f"{indent}{var_name}.object = &{object_var};\n"
-        code += f"{indent}{var_name}.kind_case = BLIZZARD__DESCRIPTOR__DESCRIPTOR__KIND_OBJECT;\n"
-    elif kind == "optional":
-        code += f"{indent}static Blizzard__Descriptor__Descriptor {var_name} = BLIZZARD__DESCRIPTOR__DESCRIPTOR__INIT;\n"
-        item_schema = schema.get("optional", {}).get("item", {})
-        optional_var = f"{var_name}_optional"
-        item_var = f"{var_name}_item"
-        code += f"{indent}static Blizzard__Descriptor__Optional {optional_var} = BLIZZARD__DESCRIPTOR__OPTIONAL__INIT;\n"
-        code += generate_descriptor_init(item_schema, item_var, indent_level)
-        code += f"{indent}{optional_var}.item = &{item_var};\n"
-        code += f"{indent}{var_name}.optional = &{optional_var};\n"
-        code += f"{indent}{var_name}.kind_case = BLIZZARD__DESCRIPTOR__DESCRIPTOR__KIND_OPTIONAL;\n"
+# Descriptors are emitted as one static const designated initializer per
+# struct, children first, so the whole tree is constant data. protobuf-c
+# links the structs through non-const pointers, hence the casts.
+#
+# Generation is split in two stages: the pool handlers append (opcode, args)
+# ops, and render_ops formats them through _OP_TEMPLATES in one loop.
+_OP_AGG_OPEN = 0
+_OP_AGG_FIELD = 1
+_OP_AGG_CLOSE = 2
+_OP_ENTRIES = 3
+_OP_BASIC = 4
+
+_OP_TEMPLATES = (
+    "{0}static const {1} {2} = {{\n",
+    "{0}   .{1} = {2},\n",
+    "{0}}};\n",
+    "{0}static Blizzard__Descriptor__Object__PropertiesEntry* const {1}[] = {{{2}}};\n",
+    # Basic descriptors are the most common node, so they get a single op
+    # instead of going through _c_aggregate.
+    """\
+{0}static const Blizzard__Descriptor__Descriptor {1} = {{
+{0}   .base = PROTOBUF_C_MESSAGE_INIT(&blizzard__descriptor__descriptor__descriptor),
+{0}   .kind_case = BLIZZARD__DESCRIPTOR__DESCRIPTOR__KIND_BASIC,
+{0}   .basic = BLIZZARD__DESCRIPTOR__BASIC_TYPES__{2},
+{0}}};
+""",
+)
+
+_Op = tuple[int, tuple[str, ...]]
+
+_DESC_BASE = "PROTOBUF_C_MESSAGE_INIT(&blizzard__descriptor__descriptor__descriptor)"
+_LIST_BASE = "PROTOBUF_C_MESSAGE_INIT(&blizzard__descriptor__list__descriptor)"
+_OBJECT_BASE = "PROTOBUF_C_MESSAGE_INIT(&blizzard__descriptor__object__descriptor)"
+_ENTRY_BASE = "PROTOBUF_C_MESSAGE_INIT(&blizzard__descriptor__object__properties_entry__descriptor)"
+_OPTIONAL_BASE = "PROTOBUF_C_MESSAGE_INIT(&blizzard__descriptor__optional__descriptor)"
+
+_KIND_LIST = ("kind_case", "BLIZZARD__DESCRIPTOR__DESCRIPTOR__KIND_LIST")
+_KIND_OBJECT = ("kind_case", "BLIZZARD__DESCRIPTOR__DESCRIPTOR__KIND_OBJECT")
+_KIND_OPTIONAL = ("kind_case", "BLIZZARD__DESCRIPTOR__DESCRIPTOR__KIND_OPTIONAL")
+_DESC_REF = "(Blizzard__Descriptor__Descriptor*)&{}"
+
+# Indent prefix per nesting level, so emitters index instead of allocating.
+_INDENTS = tuple("   " * i for i in range(32))
+
+
+def _indent(level: int) -> str:
+    """Indent prefix for level; levels past the table are built on demand."""
+    if level < len(_INDENTS):
+        return _INDENTS[level]
+    return "   " * level
+
+
+def render_ops(ops: list[_Op]) -> str:
+    """Format descriptor ops into C source."""
+    templates = _OP_TEMPLATES
+    return "".join([templates[kind].format(*args) for kind, args in ops])
+
+
+def _c_aggregate(
+    ops: list[_Op], ctype: str, var_name: str, fields: Iterable[tuple[str, str]], indent: str
+) -> None:
+    """Append (field, value) pairs to ops as a static const designated initializer."""
+    ops.append((_OP_AGG_OPEN, (indent, ctype, var_name)))
+    for field, value in fields:
+        ops.append((_OP_AGG_FIELD, (indent, field, value)))
+    ops.append((_OP_AGG_CLOSE, (indent,)))
+
+
+def _emit_desc(ops: list[_Op], var_name: str, fields: list[tuple[str, str]], indent: str) -> None:
+    _c_aggregate(
+        ops, "Blizzard__Descriptor__Descriptor", var_name, (("base", _DESC_BASE), *fields), indent
+    )
+
+
+def _emit_basic_desc(ops: list[_Op], var_name: str, basic_type: str, indent: str) -> None:
+    ops.append((_OP_BASIC, (indent, var_name, basic_type.upper())))
+
+
+def _emit_list_desc(ops: list[_Op], var_name: str, items_var: str, indent: str) -> None:
+    list_var = f"{var_name}_list"
+    _c_aggregate(
+        ops,
+        "Blizzard__Descriptor__List",
+        list_var,
+        [
+            ("base", _LIST_BASE),
+            ("items", _DESC_REF.format(items_var)),
+        ],
+        indent,
+    )
+    _emit_desc(
+        ops,
+        var_name,
+        [
+            _KIND_LIST,
+            ("list", f"(Blizzard__Descriptor__List*)&{list_var}"),
+        ],
+        indent,
+    )
+
+
+def _emit_entry_desc(ops: list[_Op], entry_var: str, prop_key: str, value_var: str, indent: str) -> None:
+    _c_aggregate(
+        ops,
+        "Blizzard__Descriptor__Object__PropertiesEntry",
+        entry_var,
+        [
+            ("base", _ENTRY_BASE),
+            ("key", f'"{prop_key}"'),
+            ("value", _DESC_REF.format(value_var)),
+        ],
+        indent,
+    )
+
+
+def _emit_object_desc(ops: list[_Op], var_name: str, n_props: int, indent: str) -> None:
+    object_var = f"{var_name}_object"
+    entries_var = f"{var_name}_entries"
+    if n_props:
+        # Entry i is the emitters' f"{var_name}_prop_{i}".
+        entries = ", ".join(
+            [f"(Blizzard__Descriptor__Object__PropertiesEntry*)&{var_name}_prop_{i}" for i in range(n_props)]
+        )
+        ops.append((_OP_ENTRIES, (indent, entries_var, entries)))
+        properties_value = f"(Blizzard__Descriptor__Object__PropertiesEntry**){entries_var}"
     else:
-        raise ValueError(f"Unknown schema kind: {kind}")
+        # C has no empty array initializers.
+        properties_value = "NULL"
+    _c_aggregate(
+        ops,
+        "Blizzard__Descriptor__Object",
+        object_var,
+        [
+            ("base", _OBJECT_BASE),
+            ("n_properties", str(n_props)),
+            ("properties", properties_value),
+        ],
+        indent,
+    )
+    _emit_desc(
+        ops,
+        var_name,
+        [
+            _KIND_OBJECT,
+            ("object", f"(Blizzard__Descriptor__Object*)&{object_var}"),
+        ],
+        indent,
+    )
+
+
+def _emit_optional_desc(ops: list[_Op], var_name: str, item_var: str, indent: str) -> None:
+    optional_var = f"{var_name}_optional"
+    _c_aggregate(
+        ops,
+        "Blizzard__Descriptor__Optional",
+        optional_var,
+        [
+            ("base", _OPTIONAL_BASE),
+            ("item", _DESC_REF.format(item_var)),
+        ],
+        indent,
+    )
+    _emit_desc(
+        ops,
+        var_name,
+        [
+            _KIND_OPTIONAL,
+            ("optional", f"(Blizzard__Descriptor__Optional*)&{optional_var}"),
+        ],
+        indent,
+    )
+
+
+# process_schemas emits each distinct descriptor shape once, as a file-scope
+# static named after a hash of the shape, and every method references it.
+# A pool maps each shape key to its (name, definition), in declaration order.
+_Pool = dict[str, tuple[str, str]]
+
+
+def _pool_descriptor(schema: Schema, pool: _Pool) -> str:
+    """Return the pooled descriptor variable for schema, adding it to pool if new.
 
-    return code
+    Children are added before their parents, so the pool's definitions are
+    in declaration order.
+    """
+    key = schema.key
+    entry = pool.get(key)
+    if entry is not None:
+        return entry[0]
+    handler = _POOL_HANDLERS.get(schema.kind)
+    if handler is None:
+        raise ValueError(f"Unknown schema kind: {schema.kind}")
+    name = "shared_desc_" + hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    ops: list[_Op] = []
+    handler(schema, name, pool, ops)
+    pool[key] = (name, render_ops(ops))
+    return name
 
 
-def pack_any_code(var_name, descriptor_var, indent_level=0):
-    indent = "   " * indent_level
-    buf_var = f"{var_name}_buf"
-    size_var = f"{var_name}_size"
-    code = f"{indent}size_t {size_var} = blizzard__descriptor__descriptor__get_packed_size(&{descriptor_var});\n"
-    code += f"{indent}if ({size_var} > sizeof({buf_var})) {{\n"
-    code += f'{indent}   perror("Buffer too small");\n'
-    code += f"{indent}   return NULL;\n"
-    code += f"{indent}}}\n"
-    code += f"{indent}blizzard__descriptor__descriptor__pack(&{descriptor_var}, {buf_var});\n"
-    code += f'{indent}{var_name}.type_url = "type.googleapis.com/blizzard.descriptor.Descriptor";\n'
-    code += f"{indent}{var_name}.value.len = {size_var};\n"
-    code += f"{indent}{var_name}.value.data = {buf_var};\n"
-    return code
+# Each handler is only dispatched for its own kind, so the child it reads is set.
+def _pool_basic(schema: Schema, name: str, pool: _Pool, ops: list[_Op]) -> None:
+    assert schema.basic is not None
+    _emit_basic_desc(ops, name, schema.basic, "")
 
 
-def generate_value_unpack_code(schema, value_var, output_var_prefix, indent_level=0):
+def _pool_list(schema: Schema, name: str, pool: _Pool, ops: list[_Op]) -> None:
+    assert schema.items is not None
+    _emit_list_desc(ops, name, _pool_descriptor(schema.items, pool), "")
+
+
+def _pool_object(schema: Schema, name: str, pool: _Pool, ops: list[_Op]) -> None:
+    properties = schema.properties
+    assert properties is not None
+    for i, (prop_key, prop_schema) in enumerate(properties.items()):
+        value_var = _pool_descriptor(prop_schema, pool)
+        _emit_entry_desc(ops, f"{name}_prop_{i}", prop_key, value_var, "")
+    _emit_object_desc(ops, name, len(properties), "")
+
+
+def _pool_optional(schema: Schema, name: str, pool: _Pool, ops: list[_Op]) -> None:
+    assert schema.item is not None
+    _emit_optional_desc(ops, name, _pool_descriptor(schema.item, pool), "")
+
+
+_POOL_HANDLERS = {
+    "basic": _pool_basic,
+    "list": _pool_list,
+    "object": _pool_object,
+    "optional": _pool_optional,
+}
+
+
+_PACK_ANY_TMPL = """\
+{i}size_t {var}_size = blizzard__descriptor__descriptor__get_packed_size(&{desc});
+{i}if ({var}_size > sizeof({var}_buf)) {{
+{i}   perror("Buffer too small");
+{i}   return NULL;
+{i}}}
+{i}blizzard__descriptor__descriptor__pack(&{desc}, {var}_buf);
+{i}{var}.type_url = "type.googleapis.com/blizzard.descriptor.Descriptor";
+{i}{var}.value.len = {var}_size;
+{i}{var}.value.data = {var}_buf;
+"""
+
+
+def pack_any_code(var_name: str, descriptor_var: str, indent_level: int = 0) -> str:
+    return _PACK_ANY_TMPL.format(
+        i=_indent(indent_level),
+        var=var_name,
+        desc=descriptor_var,
+    )
+
+
+# Objects with at least this many properties dispatch child keys on their
+# FNV-1a hash; smaller ones switch on the key length.
+_KEY_HASH_MIN_PROPS = 8
+
+
+def _fnv1a(key: str) -> int:
+    """32-bit FNV-1a of the UTF-8 key, matching blizzard_fnv1a in the runtime header."""
+    h = 0x811C9DC5
+    for b in key.encode():
+        h = ((h ^ b) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+# Unpack code per basic type: (C type of the output variable, template).
+_UNPACK_BASIC = {
+    "integer": (
+        "int64_t",
+        """\
+{i}if ({v} && {v}->kind_case == BLIZZARD__VALUE__VALUE__KIND_INTEGER) {{
+{i}   int64_t {o} = {v}->integer;
+{i}}} else {{
+{i}   send_error_response(sock, id, "Expected integer value");
+{i}   return;
+{i}}}
+""",
+    ),
+    "string": (
+        "char*",
+        """\
+{i}char* {o} = NULL;
+{i}if ({v} && {v}->kind_case == BLIZZARD__VALUE__VALUE__KIND_STRING) {{
+{i}   {o} = strdup({v}->string);
+{i}}} else {{
+{i}   send_error_response(sock, id, "Expected string value");
+{i}   return;
+{i}   }}
+""",
+    ),
+    "any_object": (
+        "Blizzard__Value__Object*",
+        """\
+{i}if ({v} && {v}->kind_case == BLIZZARD__VALUE__VALUE__KIND_OBJECT) {{
+{i}      static Blizzard__Value__Object* {o} = {v}->object;
+{i}   }} else {{
+{i}      send_error_response(sock, id, "Expected object value");
+{i}      return;
+{i}   }}
+""",
+    ),
+}
+
+
+def generate_value_unpack_code(
+    schema: Schema, value_var: str, output_var_prefix: str, indent_level: int = 0
+) -> tuple[str, list[list[str]]]:
     """Recursively generate C code to unpack a Blizzard__Value__Value based on schema."""
-    indent = "   " * indent_level
-    code = ""
-    params = []
-    kind = schema.get("kind", "").lower()
+    parts: list[str] = []
+    params = _unpack_into(schema, value_var, output_var_prefix, indent_level, parts)
+    return "".join(parts), params
 
-    if kind == "basic":
-        basic_type = schema.get("basic", "").lower()
-        if basic_type == "integer":
-            code += f"{indent}if ({value_var} && {value_var}->kind_case == BLIZZARD__VALUE__VALUE__KIND_INTEGER) {{\n"
-            code += f"{indent}   int64_t {output_var_prefix} = {value_var}->integer;\n"
-            code += f"{indent}}} else {{\n"
-            code += (
-                f'{indent}   send_error_response(sock, id, "Expected integer value");\n'
-            )
-            code += f"{indent}   return;\n"
-            code += f"{indent}}}\n"
-            return code, [["int64_t", output_var_prefix]]
-        elif basic_type == "string":
-            code += f"{indent}char* {output_var_prefix} = NULL;\n"
-            code += f"{indent}if ({value_var} && {value_var}->kind_case == BLIZZARD__VALUE__VALUE__KIND_STRING) {{\n"
-            code += f"{indent}   {output_var_prefix} = strdup({value_var}->string);\n"
-            code += f"{indent}}} else {{\n"
-            code += (
-                f'{indent}   send_error_response(sock, id, "Expected string value");\n'
-            )
-            code += f"{indent}   return;\n"
-            code += f"{indent}   }}\n"
-            return code, [["char*", output_var_prefix]]
-        elif basic_type == "any_object":
-            code += f"{indent}if ({value_var} && {value_var}->kind_case == BLIZZARD__VALUE__VALUE__KIND_OBJECT) {{\n"
-            code += f"{indent}      static Blizzard__Value__Object* {output_var_prefix} = {value_var}->object;\n"
-            code += f"{indent}   }} else {{\n"
-            code += f'{indent}      send_error_response(sock, id, "Expected object value");\n'
-            code += f"{indent}      return;\n"
-            code += f"{indent}   }}\n"
-            return code, [["Blizzard__Value__Object*", output_var_prefix]]
-        else:
-            raise ValueError(f"Unsupported basic type: {basic_type}")
-    elif kind == "list":
-        items_schema = schema.get("list", {}).get("items", {})
-        items_var = f"{output_var_prefix}_items"
-        n_var = f"n_{items_var}"
-        code += f"{indent}size_t {n_var} = 0;\n"
-        code += f"{indent}char** {items_var} = NULL;\n"
-        code += f"{indent}if ({value_var} && {value_var}->kind_case == BLIZZARD__VALUE__VALUE__KIND_LIST) {{\n"
-        code += f"{indent}   Blizzard__Value__List* list = {value_var}->list;\n"
-        code += f"{indent}   {n_var} = list->n_elements;\n"
-        item_code, item_params = generate_value_unpack_code(
-            items_schema, "list->elements[i]", "temp_item", indent_level + 1
-        )
-        item_type = item_params[0][0] if item_params else "void*"
-        code += f"{indent}   {items_var} = malloc({n_var} * sizeof({item_type}));\n"
-        code += f"{indent}   if (!{items_var}) {{\n"
-        code += f'{indent}      send_error_response(sock, id, "Malloc failed for list items");\n'
-        code += f"{indent}      return;\n"
-        code += f"{indent}   }}\n"
-        code += f"{indent}   for (size_t i = 0; i < {n_var}; i++) {{\n"
-        code += item_code.replace("return;", "continue;")
-        code += f"{indent}      {items_var}[i] = temp_item;\n"
-        code += f"{indent}   }}\n"
-        code += f"{indent}}} else {{\n"
-        code += f'{indent}   send_error_response(sock, id, "Expected list value");\n'
-        code += f"{indent}   return;\n"
-        code += f"{indent}}}\n"
-        return code, [["size_t", n_var], [f"{item_type}*", items_var]]
-    elif kind == "object":
-        properties = schema.get("object", {}).get("properties", {})
-        code += f"{indent}if ({value_var} && {value_var}->kind_case == BLIZZARD__VALUE__VALUE__KIND_OBJECT) {{\n"
-        code += f"{indent}   Blizzard__Value__Object* obj = {value_var}->object;\n"
-        params = []
-        for prop_key, prop_schema in properties.items():
-            prop_var = f"{output_var_prefix}_{prop_key}"
-            code += f"{indent}   Blizzard__Value__Value* {prop_var}_value = NULL;\n"
-            code += f"{indent}   for (size_t i = 0; i < obj->n_children; i++) {{\n"
-            code += f'{indent}      if (strcmp(obj->children[i]->key, "{prop_key}") == 0) {{\n'
-            code += f"{indent}         {prop_var}_value = obj->children[i]->value;\n"
-            code += f"{indent}         break;\n"
-            code += f"{indent}      }}\n"
-            code += f"{indent}   }}\n"
-            code += f"{indent}   if (!{prop_var}_value) {{\n"
-            code += f'{indent}      send_error_response(sock, id, "Missing property {prop_key}");\n'
-            code += f"{indent}      return;\n"
-            code += f"{indent}   }}\n"
-            prop_code, prop_params = generate_value_unpack_code(
-                prop_schema, f"{prop_var}_value", prop_var, indent_level + 1
-            )
-            code += prop_code
-            params.extend(prop_params)
-        code += f"{indent}}} else {{\n"
-        code += f'{indent}   send_error_response(sock, id, "Expected object value");\n'
-        code += f"{indent}   return;\n"
-        code += f"{indent}}}\n"
-        return code, params
-    elif kind == "optional":
-        item_schema = schema.get("optional", {}).get("item", {})
-        code += f"{indent}if ({value_var} && {value_var}->kind_case != BLIZZARD__VALUE__VALUE__KIND__NOT_SET) {{\n"
-        item_code, item_params = generate_value_unpack_code(
-            item_schema, value_var, output_var_prefix, indent_level + 1
-        )
-        code += item_code
-        code += f"{indent}}} else {{\n"
-        code += f"{indent}   // Optional not set\n"
-        code += f"{indent}   {item_params[0][0]} {output_var_prefix} = { 'NULL' if '*' in item_params[0][0] else '0' };\n"
-        code += f"{indent}}}\n"
-        return code, [[item_params[0][0], output_var_prefix]]
+
+def _unpack_into(
+    schema: Schema,
+    value_var: str,
+    output_var_prefix: str,
+    indent_level: int,
+    parts: list[str],
+) -> list[list[str]]:
+    """Append unpack code to parts; return params."""
+    handler = _UNPACK_HANDLERS.get(schema.kind)
+    if handler is None:
+        raise ValueError(f"Unknown schema kind: {schema.kind}")
+    return handler(schema, value_var, output_var_prefix, indent_level, parts)
+
+
+def _unpack_basic(
+    schema: Schema,
+    value_var: str,
+    output_var_prefix: str,
+    indent_level: int,
+    parts: list[str],
+) -> list[list[str]]:
+    basic_type = schema.basic
+    assert basic_type is not None
+    entry = _UNPACK_BASIC.get(basic_type)
+    if entry is None:
+        raise ValueError(f"Unsupported basic type: {basic_type}")
+    ctype, tmpl = entry
+    parts.append(tmpl.format(i=_indent(indent_level), v=value_var, o=output_var_prefix))
+    return [[ctype, output_var_prefix]]
+
+
+def _unpack_list(
+    schema: Schema,
+    value_var: str,
+    output_var_prefix: str,
+    indent_level: int,
+    parts: list[str],
+) -> list[list[str]]:
+    indent = _indent(indent_level)
+    items_var = f"{output_var_prefix}_items"
+    n_var = f"n_{items_var}"
+    assert schema.items is not None
+    item_code, item_params = generate_value_unpack_code(
+        schema.items, "list->elements[i]", "temp_item", indent_level + 1
+    )
+    parts.append(f"{indent}size_t {n_var} = 0;\n")
+    parts.append(f"{indent}char** {items_var} = NULL;\n")
+    parts.append(f"{indent}if ({value_var} && {value_var}->kind_case == BLIZZARD__VALUE__VALUE__KIND_LIST) {{\n")
+    parts.append(f"{indent}   Blizzard__Value__List* list = {value_var}->list;\n")
+    parts.append(f"{indent}   {n_var} = list->n_elements;\n")
+    item_type = item_params[0][0] if item_params else "void*"
+    parts.append(f"{indent}   {items_var} = malloc({n_var} * sizeof({item_type}));\n")
+    parts.append(f"{indent}   if (!{items_var}) {{\n")
+    parts.append(f'{indent}      send_error_response(sock, id, "Malloc failed for list items");\n')
+    parts.append(f"{indent}      return;\n")
+    parts.append(f"{indent}   }}\n")
+    parts.append(f"{indent}   for (size_t i = 0; i < {n_var}; i++) {{\n")
+    parts.append(item_code.replace("return;", "continue;"))
+    parts.append(f"{indent}      {items_var}[i] = temp_item;\n")
+    parts.append(f"{indent}   }}\n")
+    parts.append(f"{indent}}} else {{\n")
+    parts.append(f'{indent}   send_error_response(sock, id, "Expected list value");\n')
+    parts.append(f"{indent}   return;\n")
+    parts.append(f"{indent}}}\n")
+    return [["size_t", n_var], [f"{item_type}*", items_var]]
+
+
+def _unpack_object(
+    schema: Schema,
+    value_var: str,
+    output_var_prefix: str,
+    indent_level: int,
+    parts: list[str],
+) -> list[list[str]]:
+    indent = _indent(indent_level)
+    params = []
+    properties = schema.properties
+    assert properties is not None
+    parts.append(f"{indent}if ({value_var} && {value_var}->kind_case == BLIZZARD__VALUE__VALUE__KIND_OBJECT) {{\n")
+    parts.append(f"{indent}   Blizzard__Value__Object* obj = {value_var}->object;\n")
+    # One pass over the children fills found_var, instead of a scan per
+    # property. Each key is bucketed by a switch and confirmed with a compare.
+    # Property variables are all "<prefix>_<key>", so the array gets a name
+    # outside that scheme; the depth keeps it from shadowing an enclosing
+    # object's array.
+    found_var = f"_blz_found_{indent_level}"
+    key_index = {k: i for i, k in enumerate(properties)}
+    buckets: dict[int, list[str]] = {}
+    if len(properties) >= _KEY_HASH_MIN_PROPS:
+        # Hash bucket; strcmp rules out collisions with unknown keys.
+        for k in properties:
+            buckets.setdefault(_fnv1a(k), []).append(k)
+        selector = "blizzard_fnv1a(key)"
+        labels = {h: f"0x{h:08x}u" for h in buckets}
+        matches = {k: f'strcmp(key, "{k}") == 0' for k in properties}
     else:
-        raise ValueError(f"Unknown schema kind: {kind}")
+        # Length bucket; memcmp the key bytes.
+        for k in properties:
+            buckets.setdefault(len(k.encode()), []).append(k)
+        selector = "strlen(key)"
+        labels = {n: str(n) for n in buckets}
+        matches = {k: f'memcmp(key, "{k}", {len(k.encode())}) == 0' for k in properties}
+    if properties:
+        parts.append(f"{indent}   Blizzard__Value__Value* {found_var}[{len(properties)}] = {{0}};\n")
+        parts.append(f"{indent}   for (size_t i = 0; i < obj->n_children; i++) {{\n")
+        parts.append(f"{indent}      const char* key = obj->children[i]->key;\n")
+        parts.append(f"{indent}      switch ({selector}) {{\n")
+        for label, keys in sorted(buckets.items()):
+            parts.append(f"{indent}      case {labels[label]}:\n")
+            for j, k in enumerate(keys):
+                cond = "if" if j == 0 else "else if"
+                # The first child with a given key wins, as with the old
+                # scan that stopped at the first match.
+                parts.append(
+                    f"{indent}         {cond} ({matches[k]} && !{found_var}[{key_index[k]}]) "
+                    f"{found_var}[{key_index[k]}] = obj->children[i]->value;\n"
+                )
+            parts.append(f"{indent}         break;\n")
+        parts.append(f"{indent}      }}\n")
+        parts.append(f"{indent}   }}\n")
+    for prop_key, prop_schema in properties.items():
+        prop_var = f"{output_var_prefix}_{prop_key}"
+        parts.append(f"{indent}   Blizzard__Value__Value* {prop_var}_value = {found_var}[{key_index[prop_key]}];\n")
+        parts.append(f"{indent}   if (!{prop_var}_value) {{\n")
+        parts.append(f'{indent}      send_error_response(sock, id, "Missing property {prop_key}");\n')
+        parts.append(f"{indent}      return;\n")
+        parts.append(f"{indent}   }}\n")
+        params.extend(_unpack_into(prop_schema, f"{prop_var}_value", prop_var, indent_level + 1, parts))
+    parts.append(f"{indent}}} else {{\n")
+    parts.append(f'{indent}   send_error_response(sock, id, "Expected object value");\n')
+    parts.append(f"{indent}   return;\n")
+    parts.append(f"{indent}}}\n")
+    return params
+
+
+def _unpack_optional(
+    schema: Schema,
+    value_var: str,
+    output_var_prefix: str,
+    indent_level: int,
+    parts: list[str],
+) -> list[list[str]]:
+    indent = _indent(indent_level)
+    assert schema.item is not None
+    parts.append(f"{indent}if ({value_var} && {value_var}->kind_case != BLIZZARD__VALUE__VALUE__KIND__NOT_SET) {{\n")
+    item_params = _unpack_into(schema.item, value_var, output_var_prefix, indent_level + 1, parts)
+    item_type = item_params[0][0]
+    parts.append(f"{indent}}} else {{\n")
+    parts.append(f"{indent}   // Optional not set\n")
+    parts.append(f"{indent}   {item_type} {output_var_prefix} = { 'NULL' if '*' in item_type else '0' };\n")
+    parts.append(f"{indent}}}\n")
+    return [[item_type, output_var_prefix]]
+
+
+_UNPACK_HANDLERS = {
+    "basic": _unpack_basic,
+    "list": _unpack_list,
+    "object": _unpack_object,
+    "optional": _unpack_optional,
+}
+
+
+# Value packing per basic type: (Value kind_case suffix, field, expression).
+_PACK_BASIC = {
+    "integer": ("INTEGER", "integer", "{v}"),
+    "string": ("STRING", "string", "strdup({v})"),
+    "any_object": ("OBJECT", "object", "{v}"),
+}
+_PACK_UNSUPPORTED = {"list": "List", "object": "Object", "optional": "Optional"}
 
 
-def generate_value_pack_code(schema, value_var, output_any_var, indent_level=0):
-    indent = "   " * indent_level
-    code = f"Blizzard__Value__Value {output_any_var}_value = BLIZZARD__VALUE__VALUE__INIT;\n"
-    kind = schema.get("kind", "").lower()
+def generate_value_pack_code(
+    schema: Schema, value_var: str, output_any_var: str, indent_level: int = 0
+) -> str:
+    indent = _indent(indent_level)
+    parts = [f"Blizzard__Value__Value {output_any_var}_value = BLIZZARD__VALUE__VALUE__INIT;\n"]
+    kind = schema.kind
 
     if kind == "basic":
-        basic_type = schema.get("basic", "").lower()
-        if basic_type == "integer":
-            code += f"{indent}{output_any_var}_value.kind_case = BLIZZARD__VALUE__VALUE__KIND_INTEGER;\n"
-            code += f"{indent}{output_any_var}_value.integer = {value_var};\n"
-        elif basic_type == "string":
-            code += f"{indent}{output_any_var}_value.kind_case = BLIZZARD__VALUE__VALUE__KIND_STRING;\n"
-            code += f"{indent}{output_any_var}_value.string = strdup({value_var});\n"
-        elif basic_type == "any_object":
-            code += f"{indent}{output_any_var}_value.kind_case = BLIZZARD__VALUE__VALUE__KIND_OBJECT;\n"
-            code += f"{indent}{output_any_var}_value.object = {value_var};\n"
-        else:
+        basic_type = schema.basic or ""
+        entry = _PACK_BASIC.get(basic_type)
+        if entry is None:
             raise ValueError(f"Unsupported basic type for packing: {basic_type}")
-    elif kind == "list":
-        raise NotImplementedError("List result packing not implemented")
-    elif kind == "object":
-        raise NotImplementedError("Object result packing not implemented")
-    elif kind == "optional":
-        raise NotImplementedError("Optional result packing not implemented")
-
-    code += f"{indent}size_t {output_any_var}_size = blizzard__value__value__get_packed_size(&{output_any_var}_value);\n"
-    code += f"{indent}uint8_t* {output_any_var}_buf = malloc({output_any_var}_size);\n"
-    code += f"{indent}if (!{output_any_var}_buf) {{\n"
-    code += f'{indent}   send_error_response(sock, id, "Malloc failed for response buffer");\n'
-    code += f"{indent}   return;\n"
-    code += f"{indent}}}\n"
-    code += f"{indent}blizzard__value__value__pack(&{output_any_var}_value, {output_any_var}_buf);\n"
-    code += f"{indent}Google__Protobuf__Any* {output_any_var} = malloc(sizeof(Google__Protobuf__Any));\n"
-    code += f"{indent}google__protobuf__any__init({output_any_var});\n"
-    code += f'{indent}{output_any_var}->type_url = "type.googleapis.com/blizzard.value.Value";\n'
-    code += f"{indent}{output_any_var}->value.len = {output_any_var}_size;\n"
-    code += f"{indent}{output_any_var}->value.data = {output_any_var}_buf;\n"
-    return code
-
-
-def outparam_shape(r):
+        kind_case, field, expr = entry
+        parts.append(f"{indent}{output_any_var}_value.kind_case = BLIZZARD__VALUE__VALUE__KIND_{kind_case};\n")
+        parts.append(f"{indent}{output_any_var}_value.{field} = {expr.format(v=value_var)};\n")
+    elif kind in _PACK_UNSUPPORTED:
+        raise NotImplementedError(f"{_PACK_UNSUPPORTED[kind]} result packing not implemented")
+
+    parts.append(f"{indent}size_t {output_any_var}_size = blizzard__value__value__get_packed_size(&{output_any_var}_value);\n")
+    parts.append(f"{indent}uint8_t* {output_any_var}_buf = malloc({output_any_var}_size);\n")
+    parts.append(f"{indent}if (!{output_any_var}_buf) {{\n")
+    parts.append(f'{indent}   send_error_response(sock, id, "Malloc failed for response buffer");\n')
+    parts.append(f"{indent}   return;\n")
+    parts.append(f"{indent}}}\n")
+    parts.append(f"{indent}blizzard__value__value__pack(&{output_any_var}_value, {output_any_var}_buf);\n")
+    parts.append(f"{indent}Google__Protobuf__Any* {output_any_var} = malloc(sizeof(Google__Protobuf__Any));\n")
+    parts.append(f"{indent}google__protobuf__any__init({output_any_var});\n")
+    parts.append(f'{indent}{output_any_var}->type_url = "type.googleapis.com/blizzard.value.Value";\n')
+    parts.append(f"{indent}{output_any_var}->value.len = {output_any_var}_size;\n")
+    parts.append(f"{indent}{output_any_var}->value.data = {output_any_var}_buf;\n")
+    return "".join(parts)
+
+
+def outparam_shape(r: Mapping[str, Any]) -> dict[str, Any]:
     # For strings/bytes we pass ** so the callee can allocate (strdup/malloc)
     if r.get("set_func") == "rbusValue_SetString":
         return {"out_ctype": "char**", "call_arg": f"&{r['name']}", "needs_len": False}
@@ -260,7 +889,8 @@ def outparam_shape(r):
     # Default: pointer to the ctype (covers ints, floats, bool, etc.)
     return {"out_ctype": f"{r['ctype']}*", "call_arg": f"&{r['name']}", "needs_len": False}
 
-def classify_basic(b):
+@functools.lru_cache(maxsize=64)
+def classify_basic(b: Optional[str]) -> Optional[str]:
     b = (b or "").lower()
     if b == "string":
         return "string"
@@ -270,197 +900,265 @@ def classify_basic(b):
         return "uint"  # unsigned integer family
     return None
 
-def conv_for_input(schema):
-    s = schema or {}
-    if (s.get("kind") or "").lower() == "basic":
-        b = (s.get("basic") or "").lower()
-        cls = classify_basic(b)
-        table = {
-            "boolean": ("bool", "rbusValue_GetBoolean({v})", None),
-            "integer": ("int64_t", "rbusValue_GetInt64({v})", "int"),
-            "double": ("double", "rbusValue_GetDouble({v})", None),
-            "string": ("char const*", "rbusValue_GetString({v}, NULL)", "string"),
-            "bytes": ("uint8_t const*", "rbusValue_GetBytes({v}, NULL)", None),
-            "any_object": ("rbusObject_t", "rbusValue_GetObject({v})", None),
-            "object": ("rbusObject_t", "rbusValue_GetObject({v})", None),
-        }
-        if b in table:
-            ctype, expr, tclass = table[b]
-            return {"ctype": ctype, "expr": expr, "type_class": tclass}
-    if (s.get("kind") or "").lower() == "object":
-        return {
-            "ctype": "rbusObject_t",
-            "expr": "rbusValue_GetObject({v})",
-            "type_class": None,
-        }
-    return {"ctype": None, "expr": None, "type_class": None}
+_INPUT_TABLE = {
+    "boolean": ("bool", "rbusValue_GetBoolean({v})", None),
+    "integer": ("int64_t", "rbusValue_GetInt64({v})", "int"),
+    "double": ("double", "rbusValue_GetDouble({v})", None),
+    "string": ("char const*", "rbusValue_GetString({v}, NULL)", "string"),
+    "bytes": ("uint8_t const*", "rbusValue_GetBytes({v}, NULL)", None),
+    "any_object": ("rbusObject_t", "rbusValue_GetObject({v})", None),
+    "object": ("rbusObject_t", "rbusValue_GetObject({v})", None),
+}
+
+_RESULT_TABLE: dict[str, dict[str, Any]] = {
+    "boolean": dict(
+        ctype="bool", init="false", set_func="rbusValue_SetBoolean"
+    ),
+    "integer": dict(
+        ctype="int64_t",
+        init="0",
+        set_func="rbusValue_SetInt64",
+        type_class="int",
+    ),
+    "double": dict(ctype="double", init="0", set_func="rbusValue_SetDouble"),
+    "string": dict(
+        ctype="char*",
+        init="NULL",
+        set_func="rbusValue_SetString",
+        needs_free=True,
+        type_class="string",
+    ),
+    "bytes": dict(
+        ctype="uint8_t*",
+        init="NULL",
+        set_func="rbusValue_SetBytes",
+        needs_len=True,
+        needs_free=True,
+    ),
+    "object": dict(
+        ctype="rbusObject_t", init="NULL", set_func="rbusValue_SetObject"
+    ),
+}
+
+
+# The conversion entries are shared between callers, so they are frozen;
+# copy before mutating (process_schemas spreads them into new dicts).
+def _frozen_input(
+    ctype: Optional[str], expr: Optional[str], tclass: Optional[str]
+) -> Mapping[str, Any]:
+    return types.MappingProxyType({"ctype": ctype, "expr": expr, "type_class": tclass})
+
+
+def _frozen_result(b: str, d: dict[str, Any]) -> Mapping[str, Any]:
+    d = dict(d)
+    d.setdefault("type_class", classify_basic(b))
+    d.setdefault("needs_len", False)
+    d.setdefault("needs_free", False)
+    d.setdefault("pass_addr", False)
+    return types.MappingProxyType(d)
+
+
+_INPUT_CONV = {b: _frozen_input(*entry) for b, entry in _INPUT_TABLE.items()}
+_OBJECT_INPUT_CONV = _frozen_input("rbusObject_t", "rbusValue_GetObject({v})", None)
+_DEFAULT_INPUT_CONV = _frozen_input(None, None, None)
 
-def conv_for_result(schema):
-    s = schema or {}
-    kind = (s.get("kind") or "").lower()
+_RESULT_CONV = {b: _frozen_result(b, d) for b, d in _RESULT_TABLE.items()}
+_OBJECT_RESULT_CONV = types.MappingProxyType(
+    dict(ctype="rbusObject_t", init="NULL", set_func="rbusValue_SetObject")
+)
+_DEFAULT_RESULT_CONV = types.MappingProxyType(dict(ctype="rbusValue_t", init=None, set_func=None))
+
+
+def conv_for_input(schema: Optional[Schema]) -> Mapping[str, Any]:
+    if schema is None:
+        return _DEFAULT_INPUT_CONV
+    kind = schema.kind
     if kind == "basic":
-        b = (s.get("basic") or "").lower()
-        tclass = classify_basic(b)
-        table = {
-            "boolean": dict(
-                ctype="bool", init="false", set_func="rbusValue_SetBoolean"
-            ),
-            "integer": dict(
-                ctype="int64_t",
-                init="0",
-                set_func="rbusValue_SetInt64",
-                type_class="int",
-            ),
-            "double": dict(ctype="double", init="0", set_func="rbusValue_SetDouble"),
-            "string": dict(
-                ctype="char*",
-                init="NULL",
-                set_func="rbusValue_SetString",
-                needs_free=True,
-                type_class="string",
-            ),
-            "bytes": dict(
-                ctype="uint8_t*",
-                init="NULL",
-                set_func="rbusValue_SetBytes",
-                needs_len=True,
-                needs_free=True,
-            ),
-            "object": dict(
-                ctype="rbusObject_t", init="NULL", set_func="rbusValue_SetObject"
-            ),
-        }
-        if b in table:
-            d = table[b].copy()
-            d.setdefault("type_class", tclass)
-            d.setdefault("needs_len", False)
-            d.setdefault("needs_free", False)
-            d.setdefault("pass_addr", False)
-            return d
+        return _INPUT_CONV.get(schema.basic or "", _DEFAULT_INPUT_CONV)
     if kind == "object":
-        return dict(ctype="rbusObject_t", init="NULL", set_func="rbusValue_SetObject")
-    return dict(ctype="rbusValue_t", init=None, set_func=None)
-
-
-def process_schemas(config):
-    """Pre-process schemas to generate C init and unpack code for descriptors."""
-    processed_methods = []
-    for idx, method in enumerate(config.get("methods", [])):
-        method_copy = method.copy()
-        param_schema = method.get("parameters_schema", {})
-        result_schema = method.get("result_schema", {})
-
-        # Descriptor initialization
-        param_var = f"method_{idx}_param_desc"
-        method_copy["param_init_code"] = generate_descriptor_init(
-            param_schema, param_var, indent_level=1
-        )
-        method_copy["param_pack_code"] = pack_any_code(
-            f"method_{idx}_param_any", param_var, indent_level=1
-        )
+        return _OBJECT_INPUT_CONV
+    return _DEFAULT_INPUT_CONV
 
-        result_var = f"method_{idx}_result_desc"
-        method_copy["result_init_code"] = generate_descriptor_init(
-            result_schema, result_var, indent_level=1
-        )
-        method_copy["result_pack_code"] = pack_any_code(
-            f"method_{idx}_result_any", result_var, indent_level=1
-        )
+def conv_for_result(schema: Optional[Schema]) -> Mapping[str, Any]:
+    if schema is None:
+        return _DEFAULT_RESULT_CONV
+    kind = schema.kind
+    if kind == "basic":
+        return _RESULT_CONV.get(schema.basic or "", _DEFAULT_RESULT_CONV)
+    if kind == "object":
+        return _OBJECT_RESULT_CONV
+    return _DEFAULT_RESULT_CONV
 
-        # Parameter unpacking
-        unpack_code, params = generate_value_unpack_code(
-            param_schema, "params", f"{method['name']}_param", indent_level=0
-        )
-        method_copy["param_unpack_code"] = unpack_code
-        method_copy["params"] = params
-
-        # Result packing
-        # pack_code = generate_value_pack_code(
-        #    result_schema, f"{method['name']}_result", "success_any", indent_level=1
-        # )
-        # method_copy["result_pack_code"] = pack_code
-
-        # Interface return type
-        method_copy["return_type"] = (
-            "Blizzard__Value__Object*"
-            if result_schema.get("kind") == "basic"
-            and result_schema.get("basic") == "any_object"
-            else result_schema.get("basic", "void")
+
+def process_one_method(idx: int, method: dict[str, Any], pool: _Pool) -> None:
+    """Annotate method (the idx-th in its config) in place with its generated code.
+
+    Descriptors its pack code refers to are added to pool.
+    """
+    param_schema: Schema = method["parameters_schema"]
+    result_schema: Schema = method["result_schema"]
+
+    # Descriptors come from the shared pool
+    param_desc = _pool_descriptor(param_schema, pool)
+    method["param_pack_code"] = pack_any_code(
+        f"method_{idx}_param_any", param_desc, indent_level=1
+    )
+    result_desc = _pool_descriptor(result_schema, pool)
+    method["result_pack_code"] = pack_any_code(
+        f"method_{idx}_result_any", result_desc, indent_level=1
+    )
+
+    # Parameter unpacking
+    unpack_code, params = generate_value_unpack_code(param_schema, "params", f"{method['name']}_param")
+    method["param_unpack_code"] = unpack_code
+    method["params"] = params
+
+    # Result packing
+    # pack_code = generate_value_pack_code(
+    #    result_schema, f"{method['name']}_result", "success_any", indent_level=1
+    # )
+    # method["result_pack_code"] = pack_code
+
+    # C identifier stem for the method's _handler and _impl functions
+    method["c_name"] = method["name"].replace(".", "_").replace("()", "")
+
+    # Interface return type
+    method["return_type"] = (
+        "Blizzard__Value__Object*"
+        if result_schema.basic == "any_object"
+        else result_schema.basic or "void"
+    )
+
+    # inputs
+    iprops = param_schema.properties or {}
+    props = []
+    for name, schema in iprops.items():
+        conv = conv_for_input(schema)
+        props.append(
+            {
+                "name": name,
+                "ctype": conv["ctype"],
+                "expr": conv["expr"],
+                "type_class": conv["type_class"],
+            }
         )
+    method["props"] = props
+
+    # outputs
+    results = []
+    if result_schema.properties is not None:
+        for name, schema in result_schema.properties.items():
+            results.append({"name": name, **conv_for_result(schema)})
+    else:
+        results.append({"name": "result", **conv_for_result(result_schema)})
+    method["results"] = results
+
+    for r in results:
+        # --- auto-wire by TYPE (string/integer), not by name ------------
+        r["auto_from"] = None
+        if r.get("type_class") in ("string", "int", "uint"):
+            match = next(
+                (p for p in props if p["type_class"] == r["type_class"]),
+                None,
+            )
+            if match:
+                r["auto_from"] = match["name"]
+
+        shape = outparam_shape(r)
+        r["out_ctype"] = shape["out_ctype"]
+        r["call_arg"] = shape["call_arg"]
+        r["len_param"] = None
+        if r.get("needs_len") or shape["needs_len"]:
+            r["len_param"] = {"ctype": "int*", "name": f"{r['name']}_len", "call_arg": f"&{r['name']}_len"}
 
-        processed_methods.append(method_copy)
-
-        for m in processed_methods:
-            # inputs
-            iprops = (m.get("parameters_schema", {}) or {}).get("object", {}).get(
-                "properties", {}
-            ) or {}
-            m["props"] = []
-            for name, schema in iprops.items():
-                conv = conv_for_input(schema)
-                m["props"].append(
-                    {
-                        "name": name,
-                        "ctype": conv["ctype"],
-                        "expr": conv["expr"],
-                        "type_class": conv[
-                            "type_class"
-                        ],
-                    }
-                )
 
-            # outputs
-            rs = m.get("result_schema") or {}
-            m["results"] = []
-            if (rs.get("kind") or "").lower() == "object":
-                rprops = (rs.get("object") or {}).get("properties", {}) or {}
-                for name, schema in rprops.items():
-                    dc = conv_for_result(schema)
-                    m["results"].append({"name": name, **dc})
-            else:
-                dc = conv_for_result(rs)
-                m["results"].append({"name": "result", **dc})
-
-            # --- auto-wire by TYPE (string/integer), not by name --------------------
-            for r in m["results"]:
-                r["auto_from"] = None
-                if r.get("type_class") in ("string", "int", "uint"):
-                    match = next(
-                        (p for p in m["props"] if p["type_class"] == r["type_class"]),
-                        None,
-                    )
-                    if match:
-                        r["auto_from"] = match["name"]
-
-            for r in m["results"]:
-               shape = outparam_shape(r)
-               r["out_ctype"] = shape["out_ctype"]
-               r["call_arg"]  = shape["call_arg"]
-               r["len_param"] = None
-               if r.get("needs_len") or shape["needs_len"]:
-                     r["len_param"] = {"ctype": "int*", "name": f"{r['name']}_len", "call_arg": f"&{r['name']}_len"}
-
-    config["processed_methods"] = processed_methods
+def process_schemas(config: dict[str, Any]) -> dict[str, Any]:
+    """Pre-process schemas to generate C init and unpack code for descriptors.
+
+    Method dicts are annotated in place; config["processed_methods"] holds
+    the same objects as config["methods"]. config["descriptor_pool"] holds
+    the file-scope descriptor definitions the methods' pack code refers to.
+    """
+    methods = config.get("methods") or []
+    # One pool for all methods, so each shape is rendered once.
+    pool: _Pool = {}
+    for idx, method in enumerate(methods):
+        process_one_method(idx, method, pool)
+
+    config["processed_methods"] = list(methods)
+    config["descriptor_pool"] = "".join([code for _, code in pool.values()])
+    return config
+
+
+def _config_cache_key(input_yaml_path: str) -> Optional[str]:
+    """Hash of the input bytes, the generator version and the generator source.
+
+    The source is included so edits to the generator invalidate the cache
+    even without a version bump. Returns None if the input can't be read.
+    """
+    try:
+        with open(input_yaml_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    with open(os.path.abspath(__file__), "rb") as f:
+        source = f.read()
+    h = hashlib.sha256(GENERATOR_VERSION.encode())
+    h.update(hashlib.sha256(source).digest())
+    h.update(data)
+    return h.hexdigest()
+
+
+def load_processed_config(input_yaml_path: str) -> dict[str, Any]:
+    """load_yaml + process_schemas, cached on disk by input content hash."""
+    key = _config_cache_key(input_yaml_path)
+    if key is None:
+        # Let load_yaml report the error.
+        return process_schemas(load_yaml(input_yaml_path))
+
+    cache_path = os.path.join(_CONFIG_CACHE_DIR, key + ".pkl")
+    try:
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # Unreadable, truncated or written under another module name (the
+        # pickled Schema class is looked up by module, e.g. __main__ vs
+        # templates.generate_plugin): regenerate.
+        pass
+
+    config = process_schemas(load_yaml(input_yaml_path))
+    try:
+        os.makedirs(_CONFIG_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(config, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # caching is best effort
     return config
 
 
-def generate_plugin(input_yaml_path, output_dir, language):
+def _render_one(language: str, template_name: str, output_path: str, ctx: dict[str, Any]) -> None:
+    """Render a single template into output_path."""
+    template = _get_template(language, template_name)
+    stream = template.stream(**ctx)
+    # Batch Jinja's many small output events into fewer writes.
+    stream.enable_buffering(size=64)
+    # Binary mode with a large buffer: Jinja encodes each chunk once and the
+    # file goes out in a few large writes, with no text-layer translation.
+    with open(output_path, "wb", buffering=1 << 20) as f:
+        stream.dump(f, encoding="utf-8")
+
+
+def generate_plugin(input_yaml_path: str, output_dir: str, language: str) -> str:
     """Generate plugin template files from YAML and templates."""
 
     if language not in ["c", "cpp"]:
         raise ValueError("Unsupported language: Must be 'c' or 'cpp'")
 
-    config = load_yaml(input_yaml_path)
-    config = process_schemas(config)
+    config = load_processed_config(input_yaml_path)
 
-    template_subdir = language
-    template_dir = os.path.join(os.path.dirname(__file__), "tmpl", template_subdir)
-
-    env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(template_dir),
-        trim_blocks=True,
-        lstrip_blocks=True,
-    )
+    template_dir = _template_dir(language)
 
     plugin_name = ((config.get("plugin") or {}).get("name") or "").lower()
 
@@ -480,37 +1178,43 @@ def generate_plugin(input_yaml_path, output_dir, language):
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
-    generated_files = []
-    for template_name, output_filename in templates:
-        try:
-            template = env.get_template(template_name)
-            output_path = os.path.join(output_dir, output_filename)
-            with open(output_path, "w") as f:
-                f.write(
-                    template.render(
-                        plugin=config["plugin"],
-                        methods=config.get("processed_methods", []),
-                        plugin_name=plugin_name,
-                    )
-                )
-            generated_files.append(output_path)
-        except jinja2.TemplateNotFound:
-            print(f"Error: Template '{template_name}' not found in '{template_dir}'")
-            sys.exit(1)
-        except Exception as e:
-            print(f"Error rendering template '{template_name}': {e}")
-            sys.exit(1)
+    context = {
+        "plugin": config["plugin"],
+        "methods": config.get("processed_methods", []),
+        "plugin_name": plugin_name,
+        "descriptor_pool": config.get("descriptor_pool", ""),
+    }
+
+    # Templates are independent, so render them concurrently. The shared
+    # Environment and cached Template objects are safe for concurrent reads.
+    generated_files = [
+        os.path.join(output_dir, output_filename) for _, output_filename in templates
+    ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, len(templates))) as ex:
+        futures = {
+            ex.submit(_render_one, language, template_name, output_path, context): template_name
+            for (template_name, _), output_path in zip(templates, generated_files)
+        }
+        for fut in concurrent.futures.as_completed(futures):
+            template_name = futures[fut]
+            try:
+                fut.result()
+            except jinja2.TemplateNotFound:
+                print(f"Error: Template '{template_name}' not found in '{template_dir}'")
+                sys.exit(1)
+            except Exception as e:
+                print(f"Error rendering template '{template_name}': {e}")
+                sys.exit(1)
 
     return f"Generated files: {', '.join(generated_files)}"
 
 
-def main():
+def main() -> None:
     parser = argparse.ArgumentParser(
         description="Generate Blizzard plugin template files"
     )
     parser.add_argument(
         "--input",
-        required=True,
         help="Path to input YAML file",
     )
     parser.add_argument(
@@ -523,8 +1227,19 @@ def main():
         default="./generated",
         help="Output directory for generated files",
     )
+    parser.add_argument(
+        "--precompile",
+        action="store_true",
+        help="Precompile the templates for --language and exit",
+    )
     args = parser.parse_args()
 
+    if args.precompile:
+        print(precompile_templates(args.language))
+        return
+    if not args.input:
+        parser.error("the following arguments are required: --input")
+
     result = generate_plugin(args.input, args.output_dir, args.language)
     print(result)
 